@@ -1,161 +1,522 @@
 import yfinance as yf
+import numpy as np
 import pandas as pd
-from ib_insync import IB, Stock, MarketOrder
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    GoodFriday,
+    Holiday,
+    USLaborDay,
+    USMartinLutherKingJr,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+from numba import njit, prange
+from ib_insync import IB, Stock, MarketOrder, util
+from datetime import datetime, timedelta, time as dt_time
+from functools import lru_cache, partial
+import os
+import pickle
 import time
-from datetime import datetime, time as dt_time
 import pytz
+import schedule
 
 # Connect to IBKR API
+IB_HOST = "127.0.0.1"
+IB_PORT = 4002  # Default port for IB Gateway
+IB_CLIENT_ID = 1
+
 ib = IB()
-ib.connect("127.0.0.1", 4002, clientId=1)  # Default port for IB Gateway
+ib.connect(IB_HOST, IB_PORT, clientId=IB_CLIENT_ID)
+
+
+# Qualified IB contracts by symbol, reused across sweeps
+contracts = {}
+ORDER_ACK_WAIT = 2  # Seconds to wait for IB to acknowledge a batch of orders
+
+
+# On-disk cache for calculated indicators and per-symbol streaming state
+CACHE_DIR = "./.cache"
+STATE_PATH = "./.state.pkl"
+RESEED_WEEKS = 4  # Weeks to stream before recalculating from the full history
+SP500_CACHE_TTL = 24 * 60 * 60  # Constituents change quarterly, re-scrape daily
 
 
-# Function to fetch the list of S&P 500 stocks
+# Function to fetch the list of S&P 500 stocks (scraped at most once per TTL)
 def get_sp500_stocks():
+    return list(scrape_sp500_stocks(int(time.monotonic() // SP500_CACHE_TTL)))
+
+
+@lru_cache(maxsize=1)
+def scrape_sp500_stocks(ttl_bucket):
     url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
     tables = pd.read_html(url)
     sp500 = tables[0]
-    return sp500["Symbol"].tolist()
+    return tuple(sp500["Symbol"].tolist())
+
+
+# Weekly bars only move once a week, so cache entries are keyed by ISO week
+def current_week():
+    year, week, _ = datetime.now(pytz.timezone("US/Eastern")).isocalendar()
+    return f"{year}-W{week:02d}"
+
 
+# Function to keep only weekly bars of weeks that have already closed. Yahoo
+# labels each bar by its week's start, so anything from this week is in progress.
+def completed_bars(data):
+    today = datetime.now(pytz.timezone("US/Eastern")).date()
+    week_start = pd.Timestamp(today - timedelta(days=today.weekday()))
+    index = data.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return data[index < week_start]
 
-def calculate_indicators(stock_symbol):
+
+def load_cache(name):
+    path = os.path.join(CACHE_DIR, f"{name}-{current_week()}.pkl")
     try:
-        data = yf.download(stock_symbol, period="2y", interval="1wk")
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading cache {path}: {e}")
+        return None
 
-        # Ensure we have enough data (26 weeks for MACD, 14 weeks for RSI)
-        if data.empty or len(data) < 26:  # 26 weeks is the minimum for MACD
-            print(f"Insufficient data for {stock_symbol}.")
-            return None
 
-        # Calculate 10-week or 20-week SMA (based on available data)
-        sma_window = min(20, len(data))  # Use 10 or 20 weeks based on available data
-        data["SMA"] = data["Close"].rolling(window=sma_window).mean()
+def save_cache(name, obj):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    filename = f"{name}-{current_week()}.pkl"
+
+    # Drop entries left over from previous weeks
+    for stale in os.listdir(CACHE_DIR):
+        if stale.startswith(f"{name}-") and stale != filename:
+            os.remove(os.path.join(CACHE_DIR, stale))
+
+    with open(os.path.join(CACHE_DIR, filename), "wb") as f:
+        pickle.dump(obj, f)
+
+
+# Function to download weekly history for many symbols in batched requests
+def fetch_bulk(symbols, batch=20, period="2y"):
+    frames = {}
+    for i in range(0, len(symbols), batch):
+        chunk = symbols[i : i + batch]
+        try:
+            data = yf.download(
+                " ".join(chunk),
+                period=period,
+                interval="1wk",
+                group_by="ticker",
+                threads=True,
+                progress=False,
+            )
+        except Exception as e:
+            print(f"Error downloading batch {chunk[0]}..{chunk[-1]}: {e}")
+            continue
 
-        # Calculate MACD only if we have sufficient data
-        if len(data) >= 26:  # Check if data is enough for MACD (12 and 26 periods)
-            data["EMA12"] = data["Close"].ewm(span=12, adjust=False).mean()
-            data["EMA26"] = data["Close"].ewm(span=26, adjust=False).mean()
-            data["MACD"] = data["EMA12"] - data["EMA26"]
-            data["Signal"] = data["MACD"].ewm(span=9, adjust=False).mean()
+        # Older yfinance returns flat columns for a single ticker; give it the same
+        # (ticker, field) layout as a batch so every slice below comes out flat
+        if not isinstance(data.columns, pd.MultiIndex) and len(chunk) == 1:
+            data.columns = pd.MultiIndex.from_product([chunk, data.columns])
+
+        # Slice each symbol's frame out of the (ticker, field) column MultiIndex
+        downloaded = set(data.columns.get_level_values(0))
+        for stock_symbol in chunk:
+            if stock_symbol not in downloaded:
+                print(f"No data returned for {stock_symbol}.")
+                continue
+            frames[stock_symbol] = completed_bars(data[stock_symbol].dropna(how="all"))
+
+    return frames
+
+
+# Function to run fetch_bulk in a worker thread on ib_insync's event loop, so IB
+# socket messages keep being processed while the downloads are in flight
+def fetch_bulk_in_background(symbols, period="2y"):
+    download = partial(fetch_bulk, symbols, period=period)
+    return ib.run(util.getLoop().run_in_executor(None, download))
+
+
+# Indicator columns filled by compute_indicators, in argument order
+INDICATOR_COLUMNS = [
+    "SMA",
+    "EMA12",
+    "EMA26",
+    "MACD",
+    "Signal",
+    "RSI",
+    "Volatility",
+    "AvgVolume",
+]
+
+
+# Single-pass kernel filling all indicators for one symbol's close/volume arrays.
+# Warm-up rows are NaN, matching the pandas rolling/ewm(adjust=False) results.
+@njit(cache=True)
+def compute_indicators(
+    close,
+    volume,
+    out_sma,
+    out_ema12,
+    out_ema26,
+    out_macd,
+    out_signal,
+    out_rsi,
+    out_vol,
+    out_avgvol,
+):
+    alpha12 = 2 / 13
+    alpha26 = 2 / 27
+    alpha9 = 2 / 10
+    ema12 = ema26 = close[0]
+    signal = 0.0
+    sma_sum = avgvol_sum = gain_sum = loss_sum = ret_sum = ret_sq_sum = 0.0
+
+    for i in range(len(close)):
+        x = close[i]
+
+        # 20-week SMA and 10-week average volume from running sums
+        sma_sum += x
+        if i >= 20:
+            sma_sum -= close[i - 20]
+        out_sma[i] = sma_sum / 20 if i >= 19 else np.nan
+
+        avgvol_sum += volume[i]
+        if i >= 10:
+            avgvol_sum -= volume[i - 10]
+        out_avgvol[i] = avgvol_sum / 10 if i >= 9 else np.nan
+
+        # MACD and signal line
+        if i > 0:
+            ema12 = alpha12 * x + (1 - alpha12) * ema12
+            ema26 = alpha26 * x + (1 - alpha26) * ema26
+        macd = ema12 - ema26
+        signal = macd if i == 0 else alpha9 * macd + (1 - alpha9) * signal
+        out_ema12[i] = ema12
+        out_ema26[i] = ema26
+        out_macd[i] = macd
+        out_signal[i] = signal
+
+        # RSI from running sums of the last 14 gains and losses
+        if i > 0:
+            delta = x - close[i - 1]
+            gain_sum += max(delta, 0.0)
+            loss_sum += max(-delta, 0.0)
+        if i >= 15:
+            delta = close[i - 14] - close[i - 15]
+            gain_sum -= max(delta, 0.0)
+            loss_sum -= max(-delta, 0.0)
+        if i < 13:
+            out_rsi[i] = np.nan
+        elif loss_sum <= 0.0:
+            out_rsi[i] = np.nan if gain_sum <= 0.0 else 100.0
         else:
-            print(f"Not enough data for MACD calculation for {stock_symbol}.")
-            data["MACD"] = data["Signal"] = None
-
-        # Calculate RSI (requires at least 14 data points)
-        if len(data) >= 14:
-            delta = data["Close"].diff(1)
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(window=14).mean()
-            avg_loss = loss.rolling(window=14).mean()
-            rs = avg_gain / avg_loss
-            data["RSI"] = 100 - (100 / (1 + rs))
+            out_rsi[i] = 100 - (100 / (1 + gain_sum / loss_sum))
+
+        # Volatility (sample standard deviation of the last 10 percentage changes)
+        # from running sums of the changes and their squares
+        if i > 0:
+            r = x / close[i - 1] - 1
+            ret_sum += r
+            ret_sq_sum += r * r
+        if i >= 11:
+            r = close[i - 10] / close[i - 11] - 1
+            ret_sum -= r
+            ret_sq_sum -= r * r
+        if i < 10:
+            out_vol[i] = np.nan
         else:
-            print(f"Not enough data for RSI calculation for {stock_symbol}.")
-            data["RSI"] = None
-
-        # Calculate volatility (standard deviation of percentage price changes)
-        data["Volatility"] = data["Close"].pct_change().rolling(window=10).std()
-
-        # Calculate average trading volume
-        data["AvgVolume"] = data["Volume"].rolling(window=10).mean()
-
-        # Replace NaN or 0 values with the previous valid value or a default small value
-        data["SMA"] = data["SMA"].fillna(method="ffill")
-        data["MACD"] = data["MACD"].fillna(0)
-        data["Signal"] = data["Signal"].fillna(0)
-        data["RSI"] = data["RSI"].fillna(50)  # Default RSI to 50 if missing
-        data["Volatility"] = data["Volatility"].fillna(0)
-        data["AvgVolume"] = data["AvgVolume"].fillna(0)
-
-        # Ensure there are no missing values in the required columns for trading signal evaluation
-        if any(
-            col not in data.columns for col in ["Close", "SMA", "MACD", "Signal", "RSI"]
-        ):
-            print(f"Missing required columns in {stock_symbol}. Skipping this stock.")
+            var = (ret_sq_sum - ret_sum * ret_sum / 10) / 9
+            out_vol[i] = np.sqrt(max(var, 0.0))
+
+
+# Run the kernel over each symbol's slice of the stacked arrays, spreading
+# symbols across all CPU cores
+@njit(parallel=True, cache=True)
+def compute_all_indicators(close, volume, bounds, out):
+    for k in prange(len(bounds) - 1):
+        start, end = bounds[k], bounds[k + 1]
+        compute_indicators(
+            close[start:end],
+            volume[start:end],
+            out[0, start:end],
+            out[1, start:end],
+            out[2, start:end],
+            out[3, start:end],
+            out[4, start:end],
+            out[5, start:end],
+            out[6, start:end],
+            out[7, start:end],
+        )
+
+
+# Function to calculate indicators for every symbol in one stacked frame
+def calculate_all_indicators(history):
+    try:
+        # Ensure we have enough data (26 weeks for MACD, 14 weeks for RSI)
+        frames = {}
+        for stock_symbol, data in history.items():
+            data = data.dropna(subset=["Close", "Volume"])
+            if data.empty or len(data) < 26:  # 26 weeks is the minimum for MACD
+                print(f"Insufficient data for {stock_symbol}.")
+                continue
+            frames[stock_symbol] = data
+
+        if not frames:
             return None
 
-        return data
+        # Stack all symbols into one frame indexed by (symbol, date)
+        big = pd.concat(frames.values(), keys=frames.keys(), names=["symbol", "date"])
+        close = big["Close"].to_numpy(dtype=np.float64)
+        volume = big["Volume"].to_numpy(dtype=np.float64)
+        bounds = np.cumsum([0] + [len(data) for data in frames.values()])
+        out = np.empty((len(INDICATOR_COLUMNS), len(big)))
+        compute_all_indicators(close, volume, bounds, out)
+
+        # Attach all indicators as one float block rather than inserting columns
+        # one at a time (out.T already has the block manager's memory layout)
+        indicators = pd.DataFrame(out.T, index=big.index, columns=INDICATOR_COLUMNS)
+        big = pd.concat([big, indicators], axis=1)
+
+        # Replace NaN warm-up values with defaults in one pass (RSI defaults to 50).
+        # SMA NaNs only lead each symbol, so a forward fill has nothing to fill from.
+        big.fillna(
+            {"MACD": 0, "Signal": 0, "RSI": 50, "Volatility": 0, "AvgVolume": 0},
+            inplace=True,
+        )
+
+        return big
     except Exception as e:
-        print(f"Error calculating indicators for {stock_symbol}: {e}")
+        print(f"Error calculating indicators: {e}")
         return None
 
 
-# Function to filter stocks based on volume and volatility
-def filter_stocks(data, min_volume=1_000_000, min_volatility=0.02):
+def load_state():
     try:
-        avg_volume = data["AvgVolume"].iloc[-1]  # Extract scalar value for AvgVolume
-        volatility = data["Volatility"].iloc[-1]  # Extract scalar value for Volatility
+        with open(STATE_PATH, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Error reading state {STATE_PATH}: {e}")
+        return {}
+
+
+def save_state(state):
+    with open(STATE_PATH, "wb") as f:
+        pickle.dump(state, f)
+
+
+# One step of an exponential moving average (matches ewm(adjust=False))
+def update_ema(prev, x, span):
+    alpha = 2 / (span + 1)
+    return alpha * x + (1 - alpha) * prev
+
+
+# Function to calculate the indicators of one new bar from the previous state
+def step_indicators(state, close, volume):
+    ema12 = update_ema(state["ema12"], close, 12)
+    ema26 = update_ema(state["ema26"], close, 26)
+    macd = ema12 - ema26
+    signal = update_ema(state["signal"], macd, 9)
+    closes = np.append(state["closes"], close)[-20:]
+    volumes = np.append(state["volumes"], volume)[-10:]
+
+    # RSI over the last 14 price changes
+    delta = np.diff(closes[-15:])
+    avg_gain = np.clip(delta, 0, None).mean()
+    avg_loss = np.clip(-delta, 0, None).mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    # Volatility over the last 10 percentage price changes
+    returns = closes[-10:] / closes[-11:-1] - 1
+
+    row = {
+        "Close": close,
+        "Volume": volume,
+        "SMA": closes.mean(),
+        "EMA12": ema12,
+        "EMA26": ema26,
+        "MACD": macd,
+        "Signal": signal,
+        "RSI": 50 if np.isnan(rsi) else rsi,  # Default RSI to 50 if missing
+        "Volatility": returns.std(ddof=1),
+        "AvgVolume": volumes.mean(),
+    }
+    new_state = {
+        "close": close,
+        "ema12": ema12,
+        "ema26": ema26,
+        "signal": signal,
+        "closes": closes,
+        "volumes": volumes,
+    }
+    return row, new_state
+
+
+# Function to build the streaming state from a fully calculated indicator frame
+# of completed bars
+def seed_state(data):
+    return {
+        "date": data.index[-1],
+        "close": data["Close"].iloc[-1],
+        "ema12": data["EMA12"].iloc[-1],
+        "ema26": data["EMA26"].iloc[-1],
+        "signal": data["Signal"].iloc[-1],
+        "closes": data["Close"].to_numpy()[-20:],
+        "volumes": data["Volume"].to_numpy()[-10:],
+        "streamed": 0,
+    }
+
+
+# Function to roll the state forward over recently downloaded bars.
+# Returns None when the state cannot be continued and must be re-seeded.
+#
+# Streamed EMAs keep their original seed, while a full recalculation starts
+# them at the beginning of a sliding 2y download, so EMA26/MACD/Signal drift
+# apart by a fraction of a percent per week. That can flip a marginal
+# MACD/Signal crossover, so state is re-seeded after RESEED_WEEKS streamed weeks.
+def stream_indicators(state, recent):
+    streamed = state.get("streamed", RESEED_WEEKS)  # Older states get re-seeded
+    if state["date"] not in recent.index:
+        return None
 
-        # Ensure avg_volume and volatility are valid numbers (not NaN)
-        if pd.isna(avg_volume) or pd.isna(volatility):
-            print(
-                f"Skipping due to invalid volume/volatility: {avg_volume}, {volatility}"
-            )
-            return False
+    # A changed close on the anchor bar means prices were adjusted (split, dividend)
+    if not np.isclose(recent.at[state["date"], "Close"], state["close"]):
+        return None
 
-        # Check if stock meets volume and volatility thresholds
-        return avg_volume > min_volume and volatility > min_volatility
-    except Exception as e:
-        print(f"Error in filter_stocks: {e}")
-        return False
+    bars = recent[recent.index > state["date"]]
+    if bars.empty or bars[["Close", "Volume"]].isna().any().any():
+        return None
 
+    if streamed + len(bars) > RESEED_WEEKS:
+        return None
 
-def evaluate_trading_signals(data):
-    try:
-        # Flatten the columns and remove the multi-index
-        data.columns = [col[0] for col in data.columns]
+    for date, bar in bars.iterrows():
+        row, state = step_indicators(state, bar["Close"], bar["Volume"])
+        state["date"] = date
+    state["streamed"] = streamed + len(bars)
+
+    return bars.index[-1], row, state
+
+
+# Function to load this week's indicators, updating saved state where possible
+def load_indicators(sp500_stocks):
+    latest = load_cache("latest") or {}
+    todo = [s for s in sp500_stocks if s not in latest]
+
+    if todo:
+        state = load_state()
+
+        # Continue symbols with saved state using only the last month of bars
+        streamable = [s for s in todo if s in state]
+        if streamable:
+            recent_bars = fetch_bulk_in_background(streamable, period="1mo")
+            for stock_symbol, recent in recent_bars.items():
+                streamed = stream_indicators(state[stock_symbol], recent)
+                if streamed is not None:
+                    date, row, state[stock_symbol] = streamed
+                    latest[stock_symbol] = pd.Series(row, name=date)
+
+        # Calculate the full history for everything else and seed its state
+        seed = [s for s in todo if s not in latest]
+        if seed:
+            history = fetch_bulk_in_background(seed)
+            big = calculate_all_indicators(history)
+
+            # Symbols without enough data are not retried until next week
+            for stock_symbol in history:
+                latest[stock_symbol] = None
+                state.pop(stock_symbol, None)
+
+            # Split the stacked frame once instead of looking up each symbol
+            if big is not None:
+                for stock_symbol, data in big.groupby(level=0, sort=False):
+                    data = data.droplevel(0)
+                    state[stock_symbol] = seed_state(data)
+                    latest[stock_symbol] = data.iloc[-1]
+
+        save_cache("latest", latest)
+        save_state({s: state[s] for s in sp500_stocks if s in state})
+
+    rows = {s: latest[s] for s in sp500_stocks if latest.get(s) is not None}
+    if not rows:
+        return None
 
-        print("Columns in data:", data.columns)  # Check if the columns are correct
+    # Stack the latest row of each symbol into a (symbol, date) indexed frame
+    big = pd.DataFrame(list(rows.values()))
+    big.index = pd.MultiIndex.from_arrays(
+        [list(rows), big.index], names=["symbol", "date"]
+    )
+    return big
 
-        # Ensure that we have all the required columns before proceeding
-        required_columns = ["Close", "SMA", "MACD", "Signal", "RSI"]
-        if not all(col in data.columns for col in required_columns):
-            print(
-                f"Missing required columns: {set(required_columns) - set(data.columns)}"
-            )
-            return "HOLD"
 
-        # Drop rows where any of the required columns are NaN
-        data = data.dropna(subset=required_columns)
+# Function to screen every symbol on volume and volatility before signal evaluation
+def filter_stocks(big, min_volume=1_000_000, min_volatility=0.02):
+    try:
+        latest = big.groupby(level=0).tail(1)  # Latest row per symbol
+
+        # Missing volume/volatility values compare False and are screened out
+        keep = (latest["AvgVolume"] > min_volume) & (
+            latest["Volatility"] > min_volatility
+        )
+        return latest[keep]
+    except Exception as e:
+        print(f"Error in filter_stocks: {e}")
+        return big.iloc[0:0]
 
-        if data.empty:
-            print("Insufficient data after dropping NaN values.")
-            return "HOLD"
 
-        latest = data.iloc[-1]  # Get the latest row
+# Function to evaluate trading signals for every symbol at once
+def evaluate_trading_signals(big):
+    try:
+        latest = big.groupby(level=0).tail(1).droplevel(1)  # Latest row per symbol
 
         # Buy Signal: All indicators align for an uptrend
-        if (
-            latest["Close"] > latest["SMA"]  # Price above SMA
-            and latest["MACD"] > latest["Signal"]  # MACD > Signal Line
-            and latest["RSI"] > 50  # RSI > 50
-        ):
-            return "BUY"
+        buy = (
+            (latest["Close"] > latest["SMA"])  # Price above SMA
+            & (latest["MACD"] > latest["Signal"])  # MACD > Signal Line
+            & (latest["RSI"] > 50)  # RSI > 50
+        )
 
         # Sell Signal: All indicators align for a downtrend
-        elif (
-            latest["Close"] < latest["SMA"]  # Price below SMA
-            and latest["MACD"] < latest["Signal"]  # MACD < Signal Line
-            and latest["RSI"] < 50  # RSI < 50
-        ):
-            return "SELL"
-
-        # Hold if no clear signal
-        return "HOLD"
+        sell = (
+            (latest["Close"] < latest["SMA"])  # Price below SMA
+            & (latest["MACD"] < latest["Signal"])  # MACD < Signal Line
+            & (latest["RSI"] < 50)  # RSI < 50
+        )
+
+        # Hold if no clear signal (including missing indicator values)
+        return pd.Series(
+            np.where(buy, "BUY", np.where(sell, "SELL", "HOLD")), index=latest.index
+        )
     except Exception as e:
         print(f"Error in evaluate_trading_signals: {e}")
-        return "HOLD"
+        return pd.Series(dtype=object)
+
+
+# Function to qualify contracts for all given symbols in one batch
+def qualify_contracts(symbols):
+    new = [Stock(s, "SMART", "USD") for s in symbols if s not in contracts]
+    if not new:
+        return
+    try:
+        for contract in ib.qualifyContracts(*new):
+            contracts[contract.symbol] = contract
+    except Exception as e:
+        print(f"Error qualifying contracts: {e}")
 
 
 # Function to place buy/sell orders
-def place_order(stock_symbol, action):
+def place_order(stock_symbol, action, current_position):
     try:
-        stock = Stock(stock_symbol, "SMART", "USD")
-        positions = ib.positions()
-        current_position = sum(
-            pos.position for pos in positions if pos.contract.symbol == stock_symbol
-        )
+        stock = contracts.get(stock_symbol)
+        if stock is None:
+            print(f"No qualified contract for {stock_symbol}. No action taken.")
+            return
 
         if action == "BUY":
             order = MarketOrder("BUY", 10)  # Adjust quantity as needed
@@ -165,21 +526,53 @@ def place_order(stock_symbol, action):
                 return
             order = MarketOrder("SELL", current_position)  # Sell all shares
 
+        # placeOrder only sends the order; the status is reported once acknowledged
         trade = ib.placeOrder(stock, order)
-        print(
-            f"{action} order placed for {stock_symbol}. Status: {trade.orderStatus.status}"
-        )
+        print(f"{action} order submitted for {stock_symbol}.")
+        return trade
     except Exception as e:
         print(f"Error placing {action} order for {stock_symbol}: {e}")
 
 
+# NYSE full-day closures: the federal holidays the exchange observes plus Good Friday
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday(
+            "Juneteenth",
+            month=6,
+            day=19,
+            start_date="2022-01-01",
+            observance=nearest_workday,
+        ),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+# Function to list the trading days of the current week up to and including today
+def trading_days_this_week(today):
+    week_start = today - timedelta(days=today.weekday())
+    holidays = NYSEHolidayCalendar().holidays(week_start, today)
+    days = pd.date_range(week_start, today)
+    return [d.date() for d in days if d.weekday() < 5 and d not in holidays]
+
+
 # Function to check if the market is open
 def is_market_open():
     est = pytz.timezone("US/Eastern")
-    now = datetime.now(est).time()
+    now = datetime.now(est)
+    if now.date() not in trading_days_this_week(now.date()):
+        return False
     market_open = dt_time(9, 30)
     market_close = dt_time(16, 0)
-    return market_open <= now <= market_close
+    return market_open <= now.time() <= market_close
 
 
 # Function to monitor and trade stocks in S&P 500
@@ -187,44 +580,93 @@ def monitor_and_trade():
     sp500_stocks = get_sp500_stocks()
     print("Monitoring S&P 500 stocks for trading opportunities...")
 
-    for stock_symbol in sp500_stocks:
-        print(f"Processing {stock_symbol}...")
-
-        # Fetch historical data and calculate indicators
-        data = calculate_indicators(stock_symbol)
-
-        if data is None or len(data) < 10:  # Skip stocks with invalid data
-            print(
-                f"Skipping {stock_symbol} due to insufficient data or missing indicators."
-            )
-            continue
-
-        # Filter stocks by volume and volatility
-        if not filter_stocks(data):
-            print(f"{stock_symbol} does not meet volume/volatility criteria. Skipping.")
-            continue
-
-        # Evaluate trading signals
-        signal = evaluate_trading_signals(data)
+    # Fetch historical data and calculate indicators, reusing this week's cache
+    big = load_indicators(sp500_stocks)
+    if big is None:
+        print("No indicators calculated. Exiting...")
+        return
+
+    # Snapshot current positions once per sweep, summed across accounts
+    positions = {}
+    for pos in ib.positions():
+        symbol = pos.contract.symbol
+        positions[symbol] = positions.get(symbol, 0) + pos.position
+
+    # Screen on volume and volatility first, then evaluate signals for the rest
+    screened = filter_stocks(big)
+    print(f"{len(screened)} of {len(big)} stocks meet volume/volatility criteria.")
+
+    signals = evaluate_trading_signals(screened)
+    signals = signals[signals != "HOLD"]
+    print(f"{len(signals)} stocks with a BUY/SELL signal.")
+
+    # Qualify the contracts to trade up front instead of once per order, skipping
+    # SELL signals for stocks not held since place_order won't act on those
+    qualify_contracts(
+        [
+            s
+            for s, signal in signals.items()
+            if signal == "BUY" or positions.get(s, 0) > 0
+        ]
+    )
+
+    trades = {}
+    for stock_symbol, signal in signals.items():
         print(f"{stock_symbol} signal: {signal}")
 
         if signal == "BUY":
             print(f"{stock_symbol}: Bullish signal detected. Placing buy order...")
-            place_order(stock_symbol, "BUY")
         elif signal == "SELL":
             print(f"{stock_symbol}: Bearish signal detected. Placing sell order...")
-            place_order(stock_symbol, "SELL")
+        trade = place_order(stock_symbol, signal, positions.get(stock_symbol, 0))
+        if trade is not None:
+            trades[stock_symbol] = trade
+
+    # Wait once for IB to acknowledge all submitted orders, not once per order
+    if trades:
+        ib.sleep(ORDER_ACK_WAIT)
+        for stock_symbol, trade in trades.items():
+            print(
+                f"{trade.order.action} order for {stock_symbol}. "
+                f"Status: {trade.orderStatus.status}"
+            )
+
 
-        # Pause between stock evaluations to avoid rate-limiting
-        time.sleep(2)
+# Function to reconnect to IBKR if the gateway dropped the API socket
+# (IB Gateway restarts daily and re-authenticates weekly)
+def ensure_connected():
+    if ib.isConnected():
+        return
+    print("IBKR connection lost. Reconnecting...")
+    ib.disconnect()
+    ib.connect(IB_HOST, IB_PORT, clientId=IB_CLIENT_ID)
 
 
 # Main function to run once at market open
 def run_at_market_open():
-    if is_market_open():
-        monitor_and_trade()
-    else:
-        print("Market is closed. Exiting...")
+    try:
+        # Trade once a week, on its first trading day (Tuesday after a holiday Monday)
+        today = datetime.now(pytz.timezone("US/Eastern")).date()
+        if trading_days_this_week(today) != [today]:
+            print("Not the first trading day of the week. Skipping this run.")
+            return
+
+        if is_market_open():
+            ensure_connected()
+            monitor_and_trade()
+        else:
+            print("Market is closed. Skipping this run.")
+    except Exception as e:
+        # Log and keep the scheduler alive for the next run
+        print(f"Error in scheduled run: {e}")
+
 
+# Indicators use weekly bars, so check each morning just after the open and let
+# run_at_market_open trade only on the first trading day of the week, using the
+# bars completed by the previous week's close
+schedule.every().day.at("09:35", "US/Eastern").do(run_at_market_open)
 
-run_at_market_open()
+while True:
+    # ib.sleep keeps the IB connection serviced until the next scheduled run
+    ib.sleep(max(schedule.idle_seconds(), 0))
+    schedule.run_pending()